@@ -1,13 +1,25 @@
 import pandas as pd
 import streamlit as st
 from datetime import datetime
+from functools import partial
 
 from dashboard_sgr.config import (
     COLUMN_LABELS,
     COLUMNS_TO_EXCLUDE,
     MONETARY_COLUMNS,
+    TABLE_PAGE_SIZE,
+)
+from dashboard_sgr.data import (
+    clear_data_snapshot,
+    current_data,
+    export_excel,
+    filter_data,
+    filter_options,
+    filter_proyectos,
+    load_data,
+    load_proyectos,
+    summarize_fondos,
 )
-from dashboard_sgr.data import load_data, load_proyectos
 from dashboard_sgr.charts import (
     create_bottom_ejecucion_chart,
     create_fondo_pie_chart,
@@ -22,7 +34,7 @@ from dashboard_sgr.charts import (
     create_vigencia_chart,
 )
 from dashboard_sgr.theme import CUSTOM_CSS, PALETTE, kpi_card, section_title
-from dashboard_sgr.utils import convert_df_to_excel, format_currency
+from dashboard_sgr.utils import convert_df_to_csv, format_currency
 
 # --- Page config ---
 st.set_page_config(
@@ -35,20 +47,19 @@ st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # --- Load data ---
 with st.spinner("Conectando a la API y cargando datos..."):
-    result = load_data()
+    result = current_data()
 
 if result is None:
     st.error("No se pudieron cargar los datos. Verifica la conexion a internet.")
     st.stop()
 
-df, rows_fetched = result
+# Read-only below: filters return new frames, so no defensive copy is needed.
+df_base, rows_fetched, data_version = result
 
-if df.empty:
+if df_base.empty:
     st.error("No se pudieron cargar los datos. Verifica la conexion a internet.")
     st.stop()
 
-df_base = df.copy()
-
 # --- Sidebar ---
 with st.sidebar:
     st.markdown(
@@ -83,8 +94,65 @@ def _labeled(base, key, default, singular, plural):
     return f"{base} ({n} {word})"
 
 
+def _download_stamp(filter_key):
+    """Timestamp for download file names; only changes when the filters do."""
+    if st.session_state.get("dl_stamp_key") != filter_key:
+        st.session_state["dl_stamp_key"] = filter_key
+        st.session_state["dl_stamp"] = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return st.session_state["dl_stamp"]
+
+
+def _paginate(df, key, scope, labels=COLUMN_LABELS, page_size=TABLE_PAGE_SIZE):
+    """Render page and sort pickers and return only the rows of the selected page.
+
+    Sorting is applied to the whole table before slicing; clicking a column
+    header in st.dataframe only reorders the visible page. `scope` identifies
+    the selection that produced `df` (filters, fondo); the picker goes back to
+    page 1 whenever it or the sort changes.
+    """
+    n_pages = max(1, -(-len(df) // page_size))
+    if n_pages == 1:
+        return df
+    p1, p2, p3, p4 = st.columns([1, 2, 1, 2])
+    with p2:
+        sort_col = st.selectbox(
+            "Ordenar por", ["", *df.columns], key=f"{key}_sort",
+            format_func=lambda c: labels.get(c, c) if c else "Sin ordenar",
+            help="Ordena toda la tabla. El clic en un encabezado ordena solo la pagina visible.",
+        )
+    with p3:
+        sort_dir = st.selectbox("Orden", ["Ascendente", "Descendente"], key=f"{key}_dir")
+    scope_key = f"{key}_scope"
+    if st.session_state.get(scope_key) != (scope, sort_col, sort_dir):
+        st.session_state[scope_key] = (scope, sort_col, sort_dir)
+        st.session_state[key] = 1
+    # Clamp a stale page number when the filters shrink the table.
+    if st.session_state.get(key, 1) > n_pages:
+        st.session_state[key] = n_pages
+    with p1:
+        page = st.number_input(
+            f"Pagina (de {n_pages:,})", min_value=1, max_value=n_pages, step=1, key=key,
+        )
+    if sort_col:
+        df = df.sort_values(
+            sort_col, ascending=sort_dir == "Ascendente", kind="stable", na_position="last",
+        )
+    start = (page - 1) * page_size
+    end = min(start + page_size, len(df))
+    with p4:
+        st.markdown(
+            f'<div style="padding-top: 2.1rem; color: {PALETTE["text_muted"]}; font-size: 0.85rem;">'
+            f'Filas {start + 1:,}–{end:,} de {len(df):,}</div>',
+            unsafe_allow_html=True,
+        )
+    return df.iloc[start:end]
+
+
+# Option lists are cached per department selection (see filter_options)
+opciones = filter_options(data_version)
+
 # Fund filter
-fondos_disponibles = sorted(df_base["nombrefondo"].unique().tolist())
+fondos_disponibles = opciones["fondos"]
 default_fondos = [f for f in _qp_list("f") if f in fondos_disponibles]
 filtro_fondos = st.sidebar.multiselect(
     _labeled("Fondos", "flt_fondos", default_fondos, "seleccionado", "seleccionados"),
@@ -92,7 +160,7 @@ filtro_fondos = st.sidebar.multiselect(
 )
 
 # Department filter
-departamentos_disponibles = sorted(df_base["nombredepartamento"].unique().tolist())
+departamentos_disponibles = opciones["departamentos"]
 default_deptos = [d for d in _qp_list("d") if d in departamentos_disponibles]
 filtro_departamentos = st.sidebar.multiselect(
     _labeled("Departamentos", "flt_deptos", default_deptos,
@@ -101,11 +169,7 @@ filtro_departamentos = st.sidebar.multiselect(
 )
 
 # Entity filter (cascading)
-if filtro_departamentos:
-    entidades_pool = df_base[df_base["nombredepartamento"].isin(filtro_departamentos)]
-else:
-    entidades_pool = df_base
-entidades_disponibles = sorted(entidades_pool["nombreentidad"].unique().tolist())
+entidades_disponibles = filter_options(data_version, tuple(filtro_departamentos))["entidades"]
 if "flt_entidades" not in st.session_state:
     st.session_state["flt_entidades"] = [
         e for e in _qp_list("e") if e in entidades_disponibles
@@ -122,8 +186,8 @@ filtro_entidades = st.sidebar.multiselect(
 )
 
 # Vigencia filter
-if "vigencia" in df_base.columns:
-    vigencias_disponibles = sorted(df_base["vigencia"].unique().tolist())
+vigencias_disponibles = opciones["vigencias"]
+if vigencias_disponibles is not None:
     vig_strs = {str(v): v for v in vigencias_disponibles}
     default_vigencias = [vig_strs[v] for v in _qp_list("v") if v in vig_strs]
     filtro_vigencias = st.sidebar.multiselect(
@@ -142,7 +206,14 @@ with st.sidebar:
     st.markdown(f'<div style="margin-top: 1rem; border-top: 1px solid {PALETTE["border"]}; padding-top: 1rem;"></div>',
                 unsafe_allow_html=True)
     if st.button("Actualizar datos", use_container_width=True):
+        clear_data_snapshot()
         load_data.clear()
+        filter_data.clear()
+        filter_options.clear()
+        summarize_fondos.clear()
+        load_proyectos.clear()
+        filter_proyectos.clear()
+        export_excel.clear()
         st.rerun()
 
 # Sync URL query params
@@ -162,19 +233,12 @@ if new_qp:
     st.query_params.update(new_qp)
 
 # --- Apply filters ---
-df_filtrado = df_base.copy()
-if filtro_fondos:
-    df_filtrado = df_filtrado[df_filtrado["nombrefondo"].isin(filtro_fondos)]
-if filtro_vigencias and "vigencia" in df_filtrado.columns:
-    df_filtrado = df_filtrado[df_filtrado["vigencia"].isin(filtro_vigencias)]
-if filtro_departamentos:
-    df_filtrado = df_filtrado[df_filtrado["nombredepartamento"].isin(filtro_departamentos)]
-if filtro_entidades:
-    df_filtrado = df_filtrado[df_filtrado["nombreentidad"].isin(filtro_entidades)]
-if busqueda_texto:
-    df_filtrado = df_filtrado[
-        df_filtrado["nombreentidad"].str.contains(busqueda_texto, case=False, na=False)
-    ]
+filtros = (
+    tuple(filtro_fondos), tuple(filtro_vigencias), tuple(filtro_departamentos),
+    tuple(filtro_entidades), busqueda_texto,
+)
+df_filtrado = filter_data(data_version, *filtros)
+dl_timestamp = _download_stamp(filtros)
 
 # --- Page header ---
 st.markdown(
@@ -199,14 +263,14 @@ if len(df_filtrado) == 0:
     st.warning("No se encontraron datos con los filtros seleccionados. Ajusta los filtros en la barra lateral.")
     st.stop()
 
-tab_resumen, tab_detalles, tab_proyectos = st.tabs(["Resumen", "Detalles", "Proyectos"])
 
 # ===== TAB 1: RESUMEN EJECUTIVO =====
-with tab_resumen:
-    # Top KPIs
-    presupuesto_total = df_filtrado["presupuestosgrinversion"].sum()
-    aprobado_total = df_filtrado["recursosaprobadosasignadosspgr"].sum()
-    saldo_total = df_filtrado["SALDO_PENDIENTE"].sum()
+@st.fragment
+def render_resumen(df_filtrado, dl_timestamp):
+    # Top KPIs (one reduction over the three monetary columns)
+    presupuesto_total, aprobado_total, saldo_total = df_filtrado[
+        ["presupuestosgrinversion", "recursosaprobadosasignadosspgr", "SALDO_PENDIENTE"]
+    ].sum()
     pct_ejecucion = (aprobado_total / presupuesto_total * 100) if presupuesto_total > 0 else 0
 
     c1, c2, c3, c4 = st.columns(4)
@@ -252,18 +316,25 @@ with tab_resumen:
         f'<div style="margin-top: 2rem; padding-top: 1rem; border-top: 1px solid {PALETTE["border"]};"></div>',
         unsafe_allow_html=True,
     )
-    excel_data = convert_df_to_excel(df_filtrado)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Callable data: the files are only built when a button is clicked.
+    excel_data = partial(export_excel, df_filtrado)
     c_dl, c_pad = st.columns([1, 2])
     with c_dl:
         st.download_button(
             label="Descargar datos filtrados (Excel)",
             data=excel_data,
-            file_name=f"SGR_datos_filtrados_{timestamp}.xlsx",
+            file_name=f"SGR_datos_filtrados_{dl_timestamp}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             type="primary",
             use_container_width=True,
         )
+        st.download_button(
+            label="Descargar datos filtrados (CSV)",
+            data=partial(convert_df_to_csv, df_filtrado),
+            file_name=f"SGR_datos_filtrados_{dl_timestamp}.csv",
+            mime="text/csv",
+            use_container_width=True,
+        )
     with c_pad:
         st.markdown(
             f'<div style="padding: 0.5rem 0; color: {PALETTE["text_muted"]}; font-size: 0.85rem;">'
@@ -272,43 +343,50 @@ with tab_resumen:
             unsafe_allow_html=True,
         )
 
+
 # ===== TAB 2: DETALLES =====
-with tab_detalles:
+@st.fragment
+def render_detalles(df_filtrado, data_version, filtros, rows_fetched, dl_timestamp):
     # --- Resumen por fondo (un fondo a la vez para evitar saturacion) ---
     st.markdown(section_title("Resumen por tipo de fondo"), unsafe_allow_html=True)
-    fondos_con_datos = sorted(df_filtrado["nombrefondo"].dropna().unique().tolist())
+    # Cached per filter combination; the selectbox just picks a row.
+    resumen_fondos = summarize_fondos(data_version, *filtros)
+    fondos_con_datos = sorted(resumen_fondos.index.tolist())
     if fondos_con_datos:
         fondo_sel = st.selectbox(
             "Ver fondo:", fondos_con_datos, key="det_fondo_sel",
             label_visibility="collapsed",
         )
-        datos_fondo = df_filtrado[df_filtrado["nombrefondo"] == fondo_sel]
+        # fondo_sel is always within the active fondos filter, so its rows are
+        # a subset of df_filtrado; the categorical compare runs on codes.
+        datos_fondo = df_filtrado[(df_filtrado["nombrefondo"] == fondo_sel).to_numpy()]
+        kpis_fondo = resumen_fondos.loc[fondo_sel]
         st.markdown(
             f'<div style="color: {PALETTE["primary_dark"]}; font-weight: 600; margin: 0.75rem 0 0.5rem 0;">{fondo_sel}</div>',
             unsafe_allow_html=True,
         )
         c1, c2, c3, c4 = st.columns(4)
         with c1:
-            st.markdown(kpi_card("Registros", f"{len(datos_fondo):,}"), unsafe_allow_html=True)
+            st.markdown(kpi_card("Registros", f"{int(kpis_fondo['registros']):,}"),
+                        unsafe_allow_html=True)
         with c2:
             st.markdown(
-                kpi_card("Presupuesto", format_currency(datos_fondo["presupuestosgrinversion"].sum())),
+                kpi_card("Presupuesto", format_currency(kpis_fondo["presupuesto"])),
                 unsafe_allow_html=True,
             )
         with c3:
             st.markdown(
-                kpi_card("Aprobado",
-                         format_currency(datos_fondo["recursosaprobadosasignadosspgr"].sum())),
+                kpi_card("Aprobado", format_currency(kpis_fondo["aprobado"])),
                 unsafe_allow_html=True,
             )
         with c4:
             st.markdown(
-                kpi_card("Pendiente", format_currency(datos_fondo["SALDO_PENDIENTE"].sum())),
+                kpi_card("Pendiente", format_currency(kpis_fondo["pendiente"])),
                 unsafe_allow_html=True,
             )
     else:
         st.info("No hay datos en ningun fondo con los filtros actuales.")
-        st.stop()
+        return
 
     # --- Top entidades por saldo pendiente (scoped al fondo seleccionado) ---
     r1, r2 = st.columns([3, 1])
@@ -361,19 +439,20 @@ with tab_detalles:
     for col in df_tabla.columns:
         if col not in column_config and col in COLUMN_LABELS:
             column_config[col] = st.column_config.Column(COLUMN_LABELS[col])
+    pagina = _paginate(df_tabla, "pg_tabla_fondo", (filtros, fondo_sel))
     st.dataframe(
-        df_tabla, use_container_width=True, height=420, column_config=column_config,
+        pagina, use_container_width=True, height=420,
+        column_config=column_config,
         hide_index=True,
     )
 
     # Download del fondo seleccionado
-    excel_data_2 = convert_df_to_excel(datos_fondo)
-    timestamp_2 = datetime.now().strftime("%Y%m%d_%H%M%S")
+    excel_data_2 = partial(export_excel, datos_fondo)
     fondo_slug = fondo_sel.replace(" ", "_").replace("-", "").replace("__", "_")[:40]
     st.download_button(
         label=f"Descargar {fondo_sel} (Excel)",
         data=excel_data_2,
-        file_name=f"SGR_{fondo_slug}_{timestamp_2}.xlsx",
+        file_name=f"SGR_{fondo_slug}_{dl_timestamp}.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         key="dl_tab2",
     )
@@ -386,13 +465,16 @@ with tab_detalles:
             ]
         )
         st.dataframe(glosario, hide_index=True, use_container_width=True)
+        # rows_fetched counts rows after the server-side DATASET_WHERE filter.
         st.caption(
-            f"Total filas cargadas: {rows_fetched:,}  ·  "
+            f"Filas descargadas (con codigos DANE): {rows_fetched:,}  ·  "
             f"Fuente: datos.gov.co (Sistema General de Regalias)"
         )
 
+
 # ===== TAB 3: PROYECTOS =====
-with tab_proyectos:
+@st.fragment
+def render_proyectos(filtro_departamentos, dl_timestamp):
     st.caption(
         "Fuente complementaria: DNP-ProyectosSGR (dataset `mzgh-shtp`) — listado "
         "de proyectos aprobados SGR a nivel BPIN. Independiente de las asignaciones "
@@ -405,16 +487,11 @@ with tab_proyectos:
     if proyectos_result is None or proyectos_result[0].empty:
         st.error("No se pudieron cargar los proyectos.")
     else:
-        df_proyectos_raw, proyectos_rows = proyectos_result
-
-        # Aplicar filtro de departamento del sidebar (si hay seleccion)
-        if filtro_departamentos and "departamento" in df_proyectos_raw.columns:
-            deptos_norm = {d.upper().strip() for d in filtro_departamentos}
-            df_proyectos = df_proyectos_raw[
-                df_proyectos_raw["departamento"].str.upper().str.strip().isin(deptos_norm)
-            ].copy()
-        else:
-            df_proyectos = df_proyectos_raw.copy()
+        proyectos_rows, proyectos_version = proyectos_result[1], proyectos_result[2]
+
+        # Filtro de departamento del sidebar; define las opciones locales
+        deptos_key = tuple(filtro_departamentos)
+        df_proyectos = filter_proyectos(proyectos_version, deptos_key)
 
         # Filtros locales de proyectos
         fc1, fc2 = st.columns(2)
@@ -433,10 +510,10 @@ with tab_proyectos:
                 "Estados", estados_disp, key="flt_estados",
             )
 
-        if filtro_sectores:
-            df_proyectos = df_proyectos[df_proyectos["sector"].isin(filtro_sectores)]
-        if filtro_estados:
-            df_proyectos = df_proyectos[df_proyectos["estado"].isin(filtro_estados)]
+        if filtro_sectores or filtro_estados:
+            df_proyectos = filter_proyectos(
+                proyectos_version, deptos_key, tuple(filtro_sectores), tuple(filtro_estados),
+            )
 
         # KPIs
         total_proyectos = len(df_proyectos)
@@ -524,7 +601,7 @@ with tab_proyectos:
                 "valortotal", "ejecucionfisica", "ejecucionfinanciera",
                 "entidadejecutora", "departamento",
             ] if c in df_proyectos.columns]
-            df_tabla_p = df_proyectos[display_cols].copy()
+            df_tabla_p = df_proyectos[display_cols]
             col_cfg_p = {}
             if "valortotal" in df_tabla_p.columns:
                 col_cfg_p["valortotal"] = st.column_config.NumberColumn("Valor total", format="dollar")
@@ -544,19 +621,22 @@ with tab_proyectos:
             for col, label in pretty.items():
                 if col in df_tabla_p.columns and col not in col_cfg_p:
                     col_cfg_p[col] = st.column_config.Column(label)
+            pagina_p = _paginate(
+                df_tabla_p, "pg_tabla_proyectos",
+                (deptos_key, tuple(filtro_sectores), tuple(filtro_estados)),
+                labels=pretty,
+            )
             st.dataframe(
-                df_tabla_p, use_container_width=True, height=420,
+                pagina_p, use_container_width=True, height=420,
                 column_config=col_cfg_p, hide_index=True,
             )
 
             # Descarga
-            from dashboard_sgr.utils import convert_df_to_excel as _to_excel_p
-            excel_p = _to_excel_p(df_proyectos)
-            ts_p = datetime.now().strftime("%Y%m%d_%H%M%S")
+            excel_p = partial(export_excel, df_proyectos)
             st.download_button(
                 label="Descargar proyectos filtrados (Excel)",
                 data=excel_p,
-                file_name=f"SGR_proyectos_{ts_p}.xlsx",
+                file_name=f"SGR_proyectos_{dl_timestamp}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 key="dl_proyectos",
             )
@@ -564,6 +644,24 @@ with tab_proyectos:
         st.caption(f"Total proyectos cargados: {proyectos_rows:,}  ·  "
                    f"Fuente: datos.gov.co (DNP-ProyectosSGR, dataset mzgh-shtp)")
 
+
+# Each tab is a fragment: its local widgets (fondo, Top N, vista, paginas,
+# sector/estado) rerun only that tab, not the data load and filter pipeline.
+# Tabs track state, so only the open tab renders; hidden tabs (including the
+# Proyectos download) cost nothing on sidebar reruns.
+tab_resumen, tab_detalles, tab_proyectos = st.tabs(
+    ["Resumen", "Detalles", "Proyectos"], key="tab_activo", on_change="rerun",
+)
+if tab_resumen.open:
+    with tab_resumen:
+        render_resumen(df_filtrado, dl_timestamp)
+if tab_detalles.open:
+    with tab_detalles:
+        render_detalles(df_filtrado, data_version, filtros, rows_fetched, dl_timestamp)
+if tab_proyectos.open:
+    with tab_proyectos:
+        render_proyectos(filtro_departamentos, dl_timestamp)
+
 st.markdown(
     f"""
     <div class="dsgr-footer">
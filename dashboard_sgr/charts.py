@@ -1,20 +1,35 @@
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 
-from dashboard_sgr.config import CATCHALL_NAMES
+from dashboard_sgr.config import CACHE_TTL, CATCHALL_NAMES
 from dashboard_sgr.theme import CHART_SCALE_BLUE, CHART_SCALE_WARM, CHART_SEQUENCE, PALETTE
-from dashboard_sgr.utils import aggregate_sgr_data, format_currency, short_fondo_name
+from dashboard_sgr.utils import (
+    aggregate_sgr_data,
+    format_currency,
+    format_currency_series,
+    short_fondo_name,
+)
 
 
 def _drop_catchall(df, cols):
     """Drop rows whose values in any of `cols` match a catch-all placeholder
-    (OTROS, SIN UBICACION, etc.)."""
-    mask = pd.Series(True, index=df.index)
+    (OTROS, SIN UBICACION, etc.). Categorical columns are tested once per
+    category and mapped back through the codes; all columns share one mask."""
+    mask = np.ones(len(df), dtype=bool)
     for col in cols:
-        if col in df.columns:
-            mask &= ~df[col].astype(str).str.upper().str.strip().isin(CATCHALL_NAMES)
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            cats = series.cat.categories.astype(str).str.upper().str.strip()
+            is_catchall = np.append(cats.isin(CATCHALL_NAMES), False)
+            # Code -1 (NaN) indexes the trailing False.
+            mask &= ~is_catchall[series.cat.codes.to_numpy()]
+        else:
+            mask &= ~series.astype(str).str.upper().str.strip().isin(CATCHALL_NAMES).to_numpy()
     return df[mask]
 
 
@@ -72,16 +87,20 @@ def _apply_theme(fig, **overrides):
 
 def create_fondo_comparison_chart(df_filtrado, fondos_interes):
     try:
+        totals = df_filtrado.groupby("nombrefondo", observed=True, sort=False)[
+            ["presupuestosgrinversion", "recursosaprobadosasignadosspgr", "SALDO_PENDIENTE"]
+        ].sum()
         chart_data = []
         for fondo in fondos_interes:
-            datos_fondo = df_filtrado[df_filtrado["nombrefondo"] == fondo]
-            if len(datos_fondo) > 0:
-                chart_data.append({
-                    "Fondo": fondo.replace("ASIGNACION PARA LA INVERSION LOCAL", "INVERSION LOCAL"),
-                    "Presupuesto": datos_fondo["presupuestosgrinversion"].sum(),
-                    "Recursos Aprobados": datos_fondo["recursosaprobadosasignadosspgr"].sum(),
-                    "Saldo Pendiente": datos_fondo["SALDO_PENDIENTE"].sum(),
-                })
+            if fondo not in totals.index:
+                continue
+            row = totals.loc[fondo]
+            chart_data.append({
+                "Fondo": fondo.replace("ASIGNACION PARA LA INVERSION LOCAL", "INVERSION LOCAL"),
+                "Presupuesto": row["presupuestosgrinversion"],
+                "Recursos Aprobados": row["recursosaprobadosasignadosspgr"],
+                "Saldo Pendiente": row["SALDO_PENDIENTE"],
+            })
 
         if not chart_data:
             return None
@@ -92,19 +111,19 @@ def create_fondo_comparison_chart(df_filtrado, fondos_interes):
         fig.add_trace(go.Bar(
             name="Presupuesto", x=df_chart["Fondo"], y=df_chart["Presupuesto"],
             marker_color=PALETTE["primary"],
-            text=df_chart["Presupuesto"].apply(format_currency),
+            text=format_currency_series(df_chart["Presupuesto"]),
             textposition="outside",
         ))
         fig.add_trace(go.Bar(
             name="Recursos Aprobados", x=df_chart["Fondo"], y=df_chart["Recursos Aprobados"],
             marker_color=PALETTE["secondary"],
-            text=df_chart["Recursos Aprobados"].apply(format_currency),
+            text=format_currency_series(df_chart["Recursos Aprobados"]),
             textposition="outside",
         ))
         fig.add_trace(go.Bar(
             name="Saldo Pendiente", x=df_chart["Fondo"], y=df_chart["Saldo Pendiente"],
             marker_color=PALETTE["accent"],
-            text=df_chart["Saldo Pendiente"].apply(format_currency),
+            text=format_currency_series(df_chart["Saldo Pendiente"]),
             textposition="outside",
         ))
         return _apply_theme(
@@ -164,7 +183,9 @@ def create_fondo_pie_chart(df_filtrado, fondos_interes=None, top_n=8):
     """
     try:
         grouped = (
-            df_filtrado.groupby("nombrefondo", dropna=True)["presupuestosgrinversion"]
+            df_filtrado.groupby(
+                "nombrefondo", dropna=True, observed=True, sort=False
+            )["presupuestosgrinversion"]
             .sum()
             .sort_values(ascending=False)
         )
@@ -260,16 +281,24 @@ def create_kpi_metrics(df_filtrado):
         return None, 0
 
 
-def _build_hierarchy_records(df_filtrado):
+@st.cache_data(ttl=CACHE_TTL, max_entries=32, show_spinner=False)
+def _build_hierarchy_records(df_filtrado, max_entities=15):
     """Build (ids, labels, parents, values, texts, hovers) for a
     Fondo->Depto->Entidad hierarchy.
 
+    Cached on the frame's content: the Detalles widgets (Top N, vista,
+    pager) rerun the fragment with the same fondo subset, and the treemap
+    and sunburst share one build.
+
     - Entity level is collapsed when its name duplicates the department.
+    - At most `max_entities` tiles per department; smaller entities are
+      merged into one "Otros" tile so the browser draws hundreds of
+      rectangles, not thousands.
     - `texts` are pre-formatted labels per tile (label + currency).
     - `hovers` include a context-specific "X del fondo" / "X del depto" line.
     """
     tree_data = df_filtrado.groupby(
-        ["nombrefondo", "nombredepartamento", "nombreentidad"], dropna=False
+        ["nombrefondo", "nombredepartamento", "nombreentidad"], dropna=False, observed=True
     ).agg({"presupuestosgrinversion": "sum"}).reset_index()
 
     tree_data = tree_data[tree_data["presupuestosgrinversion"] > 0]
@@ -278,7 +307,7 @@ def _build_hierarchy_records(df_filtrado):
 
     ids, labels, parents, values, texts, hovers = [], [], [], [], [], []
 
-    for fondo_orig, grupo in tree_data.groupby("nombrefondo", dropna=False):
+    for fondo_orig, grupo in tree_data.groupby("nombrefondo", dropna=False, observed=True):
         fondo_id = f"F::{fondo_orig}"
         fondo_label = short_fondo_name(fondo_orig) if pd.notna(fondo_orig) else "(sin fondo)"
         fondo_total = float(grupo["presupuestosgrinversion"].sum())
@@ -289,7 +318,7 @@ def _build_hierarchy_records(df_filtrado):
             f"<b>{fondo_label}</b><br>Presupuesto: {format_currency(fondo_total)}"
         )
 
-        for depto, dep_grupo in grupo.groupby("nombredepartamento", dropna=False):
+        for depto, dep_grupo in grupo.groupby("nombredepartamento", dropna=False, observed=True):
             depto_label = depto if pd.notna(depto) else "(sin depto)"
             depto_id = f"{fondo_id}||D::{depto_label}"
             dep_total = float(dep_grupo["presupuestosgrinversion"].sum())
@@ -319,11 +348,20 @@ def _build_hierarchy_records(df_filtrado):
             if skip_entity_level:
                 continue
 
-            for _, row in dep_grupo.iterrows():
-                ent_label = row["nombreentidad"] if pd.notna(row["nombreentidad"]) else "(sin entidad)"
+            entities = dep_grupo
+            resto = None
+            if len(dep_grupo) > max_entities:
+                entities = dep_grupo.nlargest(max_entities - 1, "presupuestosgrinversion")
+                resto = dep_grupo.drop(index=entities.index)
+
+            for ent_name, ent_value in zip(
+                entities["nombreentidad"].to_numpy(),
+                entities["presupuestosgrinversion"].to_numpy(dtype=float),
+            ):
+                ent_label = ent_name if pd.notna(ent_name) else "(sin entidad)"
                 if str(ent_label).upper().strip() == dep_norm and len(dep_grupo) == 1:
                     continue
-                ent_value = float(row["presupuestosgrinversion"])
+                ent_value = float(ent_value)
                 ent_pct = ent_value / dep_total * 100 if dep_total else 0
                 ent_id = f"{depto_id}||E::{ent_label}"
                 ids.append(ent_id); labels.append(ent_label); parents.append(depto_id)
@@ -338,6 +376,23 @@ def _build_hierarchy_records(df_filtrado):
                     f"{ent_pct:.2f}% de {depto_label}"
                 )
 
+            if resto is not None:
+                otros_label = f"Otros ({len(resto)} entidades)"
+                otros_value = float(resto["presupuestosgrinversion"].sum())
+                otros_pct = otros_value / dep_total * 100 if dep_total else 0
+                ids.append(f"{depto_id}||E::__otros__"); labels.append(otros_label)
+                parents.append(depto_id)
+                values.append(otros_value)
+                texts.append(
+                    f"<b>{otros_label}</b><br>{format_currency(otros_value)}<br>"
+                    f"{otros_pct:.1f}% del depto"
+                )
+                hovers.append(
+                    f"<b>{otros_label}</b><br>"
+                    f"Presupuesto: {format_currency(otros_value)}<br>"
+                    f"{otros_pct:.2f}% de {depto_label}"
+                )
+
     return ids, labels, parents, values, texts, hovers
 
 
@@ -441,7 +496,7 @@ def create_presupuesto_vs_saldo_chart(df_filtrado, top_n=10):
             width=bar_width,
             marker={"color": PALETTE["accent"], "line": {"width": 0}},
             hovertemplate="<b>%{y}</b><br>Pendiente: $%{x:,.0f}<extra></extra>",
-            text=[f"  {format_currency(p)}" for p in dept_data["presupuestosgrinversion"]],
+            text=["  " + t for t in format_currency_series(dept_data["presupuestosgrinversion"])],
             textposition="outside",
             textfont={"size": 11, "color": PALETTE["text_muted"]},
             cliponaxis=False,
@@ -498,7 +553,7 @@ def create_bottom_ejecucion_chart(df_filtrado, bottom_n=5):
             y=dept_data["nombredepartamento"],
             orientation="h",
             marker_color=PALETTE["danger"],
-            text=dept_data["pct_ejecucion"].apply(lambda v: f"{v:.1f}%"),
+            texttemplate="%{x:.1f}%",
             textposition="outside",
             hovertemplate="<b>%{y}</b><br>Ejecucion: %{x:.1f}%<extra></extra>",
         ))
@@ -527,14 +582,10 @@ def create_saldo_pendiente_chart(df_filtrado, top_n=10):
         if entidad_data.empty or entidad_data["SALDO_PENDIENTE"].sum() == 0:
             return None
 
-        def _entidad_label(row):
-            ent = str(row["nombreentidad"]).strip()
-            dep = str(row["nombredepartamento"]).strip()
-            if ent.upper() == dep.upper():
-                return ent
-            return f"{ent} · {dep}"
-
-        entidad_data["label"] = entidad_data.apply(_entidad_label, axis=1)
+        # "Entidad · Depto", or just the entity when it is the department itself.
+        ent = entidad_data["nombreentidad"].astype(str).str.strip()
+        dep = entidad_data["nombredepartamento"].astype(str).str.strip()
+        entidad_data["label"] = ent.where(ent.str.upper() == dep.str.upper(), ent + " · " + dep)
 
         fig = px.bar(
             entidad_data,
@@ -546,7 +597,7 @@ def create_saldo_pendiente_chart(df_filtrado, top_n=10):
             color_continuous_scale=CHART_SCALE_WARM,
         )
         fig.update_traces(
-            text=[format_currency(v) for v in entidad_data["SALDO_PENDIENTE"]],
+            text=format_currency_series(entidad_data["SALDO_PENDIENTE"]),
             textposition="outside",
             hovertemplate="<b>%{y}</b><br>Saldo: $%{x:,.0f}<extra></extra>",
             cliponaxis=False,
@@ -576,7 +627,7 @@ def create_vigencia_chart(df_filtrado):
         return None
 
     try:
-        vigencia_data = df_filtrado.groupby("vigencia").agg(
+        vigencia_data = df_filtrado.groupby("vigencia", observed=True).agg(
             {"presupuestosgrinversion": "sum", "recursosaprobadosasignadosspgr": "sum"}
         ).reset_index()
 
@@ -588,14 +639,14 @@ def create_vigencia_chart(df_filtrado):
             name="Presupuesto", x=vigencia_data["vigencia"],
             y=vigencia_data["presupuestosgrinversion"],
             marker_color=PALETTE["primary"],
-            text=vigencia_data["presupuestosgrinversion"].apply(format_currency),
+            text=format_currency_series(vigencia_data["presupuestosgrinversion"]),
             textposition="outside",
         ))
         fig.add_trace(go.Bar(
             name="Recursos Aprobados", x=vigencia_data["vigencia"],
             y=vigencia_data["recursosaprobadosasignadosspgr"],
             marker_color=PALETTE["secondary"],
-            text=vigencia_data["recursosaprobadosasignadosspgr"].apply(format_currency),
+            text=format_currency_series(vigencia_data["recursosaprobadosasignadosspgr"]),
             textposition="outside",
         ))
         return _apply_theme(
@@ -706,7 +757,7 @@ def create_proyectos_top_entidades_chart(df_proyectos, top_n=10):
         if df_proyectos.empty or "entidadejecutora" not in df_proyectos.columns:
             return None
         agg = (
-            df_proyectos.groupby("entidadejecutora", dropna=True)["valortotal"]
+            df_proyectos.groupby("entidadejecutora", dropna=True, sort=False)["valortotal"]
             .sum()
             .sort_values(ascending=False)
         )
@@ -719,7 +770,7 @@ def create_proyectos_top_entidades_chart(df_proyectos, top_n=10):
             y=agg.index,
             orientation="h",
             marker={"color": PALETTE["primary"], "line": {"width": 0}},
-            text=[format_currency(v) for v in agg.values],
+            text=format_currency_series(agg.values),
             textposition="outside",
             cliponaxis=False,
             hovertemplate="<b>%{y}</b><br>Valor total: $%{x:,.0f}<extra></extra>",
@@ -753,7 +804,8 @@ def create_proyectos_ejecucion_chart(df_proyectos):
             part = sub[sub["estado"] == estado]
             if part.empty:
                 continue
-            fig.add_trace(go.Scatter(
+            # WebGL trace: the full project list is ~35k points.
+            fig.add_trace(go.Scattergl(
                 x=part["ejecucionfisica"],
                 y=part["ejecucionfinanciera"],
                 mode="markers",
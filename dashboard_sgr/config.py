@@ -1,13 +1,45 @@
+import os
+
+# Project root (the directory holding dashboard_sgr/, data/ and divipola.csv).
+# Local data paths are anchored here, so they do not depend on the directory
+# streamlit was started from.
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 # Socrata API
 SOCRATA_DOMAIN = "www.datos.gov.co"
 DATASET_ID = "g4qj-2p2e"          # Asignaciones SGR por entidad / fondo / vigencia
 DATASET_ID_PROYECTOS = "mzgh-shtp"  # DNP-ProyectosSGR: proyectos aprobados a nivel BPIN
 API_ROW_LIMIT = 5000
+API_MAX_WORKERS = 4  # concurrent page requests per dataset download
 API_MAX_RETRIES = 3
 API_RETRY_BACKOFF = 2  # seconds
 
+# Columns requested from g4qj-2p2e ($select). Socrata omits a field from the
+# response when it is null in every returned row, so optional columns
+# (vigencia) are still guarded downstream. codigofondo and nombrebolsaregional
+# are hidden in the UI (COLUMNS_TO_EXCLUDE) but kept for the Excel/CSV exports.
+DATASET_COLUMNS = [
+    "vigencia",
+    "codigofondo",
+    "nombrefondo",
+    "codigodanedepartamento",
+    "nombredepartamento",
+    "codigodaneentidad",
+    "nombreentidad",
+    "nombrebolsaregional",
+    "presupuestosgrinversion",
+    "numeroproyectosaprobados",
+    "recursosaprobadosasignadosspgr",
+]
+# Row filter pushed to the API ($where): load_data drops rows without both
+# DANE codes anyway, so they are never downloaded.
+DATASET_WHERE = "codigodanedepartamento IS NOT NULL AND codigodaneentidad IS NOT NULL"
+
 # Cache
 CACHE_TTL = 3600  # 1 hour in seconds
+# Cleaned asignaciones frame persisted by load_data; a process restart within
+# CACHE_TTL reads it instead of downloading and cleaning again.
+DATA_PARQUET_PATH = os.path.join(PROJECT_DIR, "data", "sgr_asignaciones.parquet")
 
 # Department name mapping: SGR names -> GeoJSON names.
 # Only irregular cases; tilde/diacritic differences are handled by strip_accents.
@@ -16,6 +48,9 @@ DEPT_NAME_MAPPING = {
     "BOGOTÁ D.C.": "SANTAFE DE BOGOTA D.C",
 }
 
+# Rows per page in the data tables (only the visible page is sent to the browser)
+TABLE_PAGE_SIZE = 200
+
 # Columns to exclude from data table display
 COLUMNS_TO_EXCLUDE = [
     "codigofondo",
@@ -24,6 +59,15 @@ COLUMNS_TO_EXCLUDE = [
     "nombrebolsaregional",
 ]
 
+# Low-cardinality text columns stored as pandas `category` after load.
+# Sidebar filters (isin) and groupbys then work on integer codes.
+CATEGORICAL_COLUMNS = [
+    "nombrefondo",
+    "nombredepartamento",
+    "nombreentidad",
+    "vigencia",
+]
+
 # Catch-all values used in the source data for unassigned dept/entity rows.
 # Rankings exclude these to avoid swamping real top entries.
 CATCHALL_NAMES = {"OTROS", "SIN UBICACION", "SIN UBICACIÓN"}
@@ -51,16 +95,30 @@ COLUMN_LABELS = {
     "SALDO_PENDIENTE": "Saldo Pendiente",
 }
 
+# Municipality coordinates (CSV is the source; Parquet is a parse cache)
+MUNICIPIOS_CSV_PATH = os.path.join(PROJECT_DIR, "divipola.csv")
+MUNICIPIOS_PARQUET_PATH = os.path.join(PROJECT_DIR, "data", "divipola.parquet")
+# divipola columns the map join reads; the frame is indexed by the DANE code
+# (COD_MPIO parsed as an integer and exposed as the COD_MPIO_CLEAN index)
+MUNICIPIOS_COLUMNS = ["NOM_MPIO", "NOM_DPTO", "LATITUD", "LONGITUD"]
+
 # GeoJSON
-GEOJSON_LOCAL_PATH = "data/colombia.geo.json"
+GEOJSON_LOCAL_PATH = os.path.join(PROJECT_DIR, "data", "colombia.geo.json")
 GEOJSON_URL = (
     "https://gist.githubusercontent.com/john-guerra/"
     "43c7656821069d00dcbc/raw/be6a6e239cd5b5b803c6e7c2ec405b793a9064dd/"
     "Colombia.geo.json"
 )
+# Coordinates are rounded to this many decimals when the GeoJSON is parsed
+# (~11 m); the maps open at zoom 5-6, so the rest is payload only.
+GEOJSON_COORD_DECIMALS = 4
 
 # Map defaults
 MAP_CENTER_LAT = 4.5709
 MAP_CENTER_LON = -74.2973
 DEFAULT_ZOOM = 5
 MAP_STYLE = "light"
+# Above this many municipalities the scatter map switches to a GPU heatmap.
+# The largest department (Antioquia, 125) stays below it, so single-department
+# views keep their pickable circles.
+MAP_HEATMAP_MIN_POINTS = 150
@@ -1,7 +1,10 @@
 import json
 import os
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 import requests
 import streamlit as st
@@ -9,42 +12,159 @@ from sodapy import Socrata
 
 from dashboard_sgr.config import (
     API_MAX_RETRIES,
+    API_MAX_WORKERS,
     API_RETRY_BACKOFF,
     API_ROW_LIMIT,
     CACHE_TTL,
+    CATEGORICAL_COLUMNS,
+    DATA_PARQUET_PATH,
+    DATASET_COLUMNS,
     DATASET_ID,
     DATASET_ID_PROYECTOS,
+    DATASET_WHERE,
     DEPT_NAME_MAPPING,
+    GEOJSON_COORD_DECIMALS,
     GEOJSON_LOCAL_PATH,
     GEOJSON_URL,
+    MUNICIPIOS_COLUMNS,
+    MUNICIPIOS_CSV_PATH,
+    MUNICIPIOS_PARQUET_PATH,
     SOCRATA_DOMAIN,
 )
-from dashboard_sgr.utils import aggregate_sgr_data, normalize_color_intensity, strip_accents
+from dashboard_sgr.utils import (
+    aggregate_sgr_data,
+    blue_ramp_rgba,
+    convert_df_to_excel,
+    normalize_color_intensity,
+    strip_accents,
+)
+
+
+def _fetch_all_rows(client, dataset_id, columns=None, **params):
+    """Download every row of a Socrata dataset.
+
+    Asks for the row count first and then requests the API_ROW_LIMIT pages
+    concurrently, retrying each page independently. Pages are ordered by `:id`
+    so offsets are stable.
+    `columns` is pushed down as `$select` so unused fields never leave the API.
+    """
+    count_rows = client.get(dataset_id, select="count(*)", **params)
+    total = int(next(iter(count_rows[0].values()))) if count_rows else 0
+    if columns:
+        params["select"] = ",".join(columns)
+
+    def _page(offset):
+        # A failed page is retried on its own, so one flaky request does not
+        # throw away (and re-download) every page that already arrived.
+        for attempt in range(1, API_MAX_RETRIES + 1):
+            try:
+                return client.get(
+                    dataset_id, limit=API_ROW_LIMIT, offset=offset, order=":id", **params,
+                )
+            except Exception:
+                if attempt == API_MAX_RETRIES:
+                    raise
+                time.sleep(API_RETRY_BACKOFF * attempt)
+
+    with ThreadPoolExecutor(max_workers=API_MAX_WORKERS) as pool:
+        pages = pool.map(_page, range(0, total, API_ROW_LIMIT))
+        return [row for page in pages for row in page]
+
+
+@st.cache_resource
+def _socrata_client():
+    """Shared Socrata client.
+
+    Its requests session keeps TLS connections alive, so page requests and
+    later cache refills reuse sockets instead of renegotiating each time.
+    """
+    return Socrata(SOCRATA_DOMAIN, None)
+
+
+def _records_frame(records):
+    """Build a DataFrame from Socrata records with Arrow-backed string columns.
+
+    Socrata returns every field as text; Arrow strings (the pandas 3 default,
+    opted into here on pandas 2.x) avoid one Python object per cell and speed
+    up the `.str` cleanup and categorical encoding that follow.
+    """
+    with pd.option_context("future.infer_string", True):
+        return pd.DataFrame.from_records(records)
+
+
+def _read_data_snapshot():
+    """Return (df, rows_fetched, loaded_at) from the Parquet snapshot if it is
+    younger than CACHE_TTL, else None. loaded_at is the snapshot's mtime."""
+    try:
+        loaded_at = os.path.getmtime(DATA_PARQUET_PATH)
+        if time.time() - loaded_at < CACHE_TTL:
+            df = pd.read_parquet(DATA_PARQUET_PATH)
+            return df, int(df.attrs.pop("rows_fetched", len(df))), loaded_at
+    except Exception:
+        pass  # missing, stale or unreadable: fetch from the API
+    return None
+
+
+def _write_data_snapshot(df, rows_fetched):
+    """Persist the cleaned frame for the next process start.
+
+    Written to a temporary file and moved into place with os.replace, so a
+    concurrent reader sees either the old snapshot or the new one, never a
+    partial file.
+    """
+    snapshot = df.copy(deep=False)
+    snapshot.attrs["rows_fetched"] = rows_fetched
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(DATA_PARQUET_PATH) or ".", suffix=".parquet.tmp",
+        )
+    except OSError:
+        return  # read-only checkout: every start fetches from the API
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            snapshot.to_parquet(fh)
+        os.replace(tmp_path, DATA_PARQUET_PATH)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def clear_data_snapshot():
+    """Delete the on-disk snapshot so the next load_data call refetches."""
+    try:
+        os.remove(DATA_PARQUET_PATH)
+    except OSError:
+        pass
 
 
 @st.cache_data(ttl=CACHE_TTL)
 def load_data():
-    """Fetch SGR data from Socrata API with pagination and retry logic."""
+    """Fetch SGR data from Socrata API with parallel pagination and retry logic.
+
+    Returns (DataFrame, rows_fetched, loaded_at). loaded_at (epoch seconds)
+    identifies this download: the derived caches (filter_data, filter_options,
+    summarize_fondos) take it as their first argument, so a refill after the
+    TTL never mixes with entries computed from the previous download.
+
+    A cleaned copy is kept as Parquet (DATA_PARQUET_PATH) so a restart within
+    CACHE_TTL skips the download, JSON parse and cleanup. A snapshot read just
+    before it expires is cached for another full CACHE_TTL; use `current_data`,
+    which refills once loaded_at is older than CACHE_TTL.
+    """
+    snapshot = _read_data_snapshot()
+    if snapshot is not None:
+        return snapshot
+
     for attempt in range(1, API_MAX_RETRIES + 1):
         try:
-            client = Socrata(SOCRATA_DOMAIN, None)
-            all_results = []
-            offset = 0
-
-            while True:
-                batch = client.get(
-                    DATASET_ID,
-                    limit=API_ROW_LIMIT,
-                    offset=offset,
-                )
-                if not batch:
-                    break
-                all_results.extend(batch)
-                if len(batch) < API_ROW_LIMIT:
-                    break
-                offset += API_ROW_LIMIT
-
-            df = pd.DataFrame.from_records(all_results)
+            client = _socrata_client()
+            all_results = _fetch_all_rows(
+                client, DATASET_ID, columns=DATASET_COLUMNS, where=DATASET_WHERE,
+            )
+
+            df = _records_frame(all_results)
             rows_fetched = len(df)
 
             # Validate expected columns
@@ -55,84 +175,290 @@ def load_data():
             if missing:
                 st.warning(f"Columnas faltantes en los datos: {missing}")
 
-            # Process DANE department code
+            # Process DANE codes; rows missing either code are dropped in one pass
             df["codigodanedepartamento"] = pd.to_numeric(
                 df["codigodanedepartamento"], errors="coerce"
             )
-            df = df.dropna(subset=["codigodanedepartamento"])
-            df["codigodanedepartamento"] = (df["codigodanedepartamento"] / 1000).astype(int)
-
-            # Process DANE entity code
+            df["codigodaneentidad"] = pd.to_numeric(df["codigodaneentidad"], errors="coerce")
+            df = df.dropna(subset=["codigodanedepartamento", "codigodaneentidad"])
+            # Integer arithmetic on the raw int64 arrays (no float temporaries)
+            deptos = df["codigodanedepartamento"].to_numpy(dtype=np.int64)
+            codes = df["codigodaneentidad"].to_numpy(dtype=np.int64)
+            # DANE codes fit in int8 (depto) / int32 (entidad); narrow them so
+            # filters and merges stream fewer bytes.
+            df["codigodanedepartamento"] = pd.to_numeric(deptos // 1000, downcast="integer")
             df["codigodaneentidad"] = pd.to_numeric(
-                df["codigodaneentidad"].str.strip(), errors="coerce"
-            )
-            df = df.dropna(subset=["codigodaneentidad"])
-            df["codigodaneentidad"] = df["codigodaneentidad"].astype(int)
-            df["codigodaneentidad"] = df["codigodaneentidad"].apply(
-                lambda x: x // 1000 if x % 1000 == 0 else x
+                np.where(codes % 1000 == 0, codes // 1000, codes), downcast="integer"
             )
 
-            # Convert monetary columns
-            df["presupuestosgrinversion"] = (
-                df["presupuestosgrinversion"].str.strip().astype(float)
-            )
-            df["recursosaprobadosasignadosspgr"] = (
-                df["recursosaprobadosasignadosspgr"].str.strip().astype(float)
-            )
+            # Convert monetary columns (a malformed value becomes NaN instead of
+            # failing the whole download and triggering a retry). to_numeric
+            # skips surrounding whitespace, so no stripped copy is built first.
+            # The float64 cast keeps the dtype stable when every amount in a
+            # download happens to be a whole number (to_numeric infers int64).
+            for col in ("presupuestosgrinversion", "recursosaprobadosasignadosspgr"):
+                df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
             df["SALDO_PENDIENTE"] = (
                 df["presupuestosgrinversion"] - df["recursosaprobadosasignadosspgr"]
             ).clip(lower=0)
 
-            return df, rows_fetched
+            # Project count: coerced once here to nullable Int32, so missing or
+            # malformed values stay blank in the table and exports while the
+            # aggregations skip them when summing.
+            df["numeroproyectosaprobados"] = np.trunc(
+                pd.to_numeric(df["numeroproyectosaprobados"], errors="coerce")
+            ).astype("Int32")
+
+            # Encode filter/group keys once per cache fill; reruns then filter on codes.
+            for col in CATEGORICAL_COLUMNS:
+                if col in df.columns:
+                    df[col] = df[col].astype("category")
+
+            _write_data_snapshot(df, rows_fetched)
+            return df, rows_fetched, time.time()
 
         except Exception as e:
             if attempt < API_MAX_RETRIES:
                 time.sleep(API_RETRY_BACKOFF * attempt)
             else:
                 st.error(f"Error al cargar los datos tras {API_MAX_RETRIES} intentos: {e}")
-                return pd.DataFrame(), 0
+                return pd.DataFrame(), 0, time.time()
+
+
+def current_data():
+    """`load_data()`, refilled when the cached frame is older than CACHE_TTL.
+
+    Bounds the age of the served data by CACHE_TTL, counted from the download
+    (or snapshot write) rather than from the cache fill.
+    """
+    result = load_data()
+    if time.time() - result[2] >= CACHE_TTL:
+        load_data.clear()
+        result = load_data()
+    return result
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=32)
+def filter_data(data_version, fondos=(), vigencias=(), departamentos=(), entidades=(),
+                texto=""):
+    """Apply the sidebar filters to the cached SGR frame.
+
+    Keyed on `data_version` (load_data's loaded_at) and the filter values
+    (pass tuples), so reruns with unchanged filters skip the mask pass. All
+    conditions are ANDed into one boolean array and the frame is indexed
+    once. Clear together with `load_data`.
+    """
+    df, _, _ = load_data()
+    if df.empty:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    if fondos:
+        mask &= df["nombrefondo"].isin(fondos).to_numpy()
+    if vigencias and "vigencia" in df.columns:
+        mask &= df["vigencia"].isin(vigencias).to_numpy()
+    if departamentos:
+        mask &= df["nombredepartamento"].isin(departamentos).to_numpy()
+    if entidades:
+        mask &= df["nombreentidad"].isin(entidades).to_numpy()
+    if texto:
+        # Literal substring match: no regex compile, and "." or "(" in the
+        # search box no longer behave as patterns.
+        mask &= df["nombreentidad"].str.contains(
+            texto, case=False, na=False, regex=False
+        ).to_numpy(dtype=bool)
+    return df[mask]
+
+
+def _options(series):
+    """Sorted distinct values of a filter column.
+
+    Categorical columns read their (already sorted) categories off the
+    integer codes instead of hashing every string.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.remove_unused_categories().cat.categories.tolist()
+    return sorted(series.dropna().unique().tolist())
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=32)
+def filter_options(data_version, departamentos=()):
+    """Option lists for the sidebar filters.
+
+    Keyed on `data_version` and the selected departments, which narrow the
+    entity list (the cascade); the other lists come from the full frame.
+    Reruns read the lists from cache instead of rescanning the columns.
+    `vigencias` is None when the dataset has no vigencia column. Clear
+    together with `load_data`.
+    """
+    df, _, _ = load_data()
+    entidades = df["nombreentidad"]
+    if departamentos:
+        entidades = entidades[df["nombredepartamento"].isin(departamentos)]
+    return {
+        "fondos": _options(df["nombrefondo"]),
+        "departamentos": _options(df["nombredepartamento"]),
+        "entidades": _options(entidades),
+        "vigencias": _options(df["vigencia"]) if "vigencia" in df.columns else None,
+    }
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=32)
+def summarize_fondos(data_version, fondos=(), vigencias=(), departamentos=(), entidades=(),
+                     texto=""):
+    """Per-fondo totals (registros, presupuesto, aprobado, pendiente).
+
+    Same key as `filter_data`, so the Detalles widgets (fondo, Top N, vista,
+    pager) reuse the table instead of regrouping the frame on every rerun.
+    """
+    df = filter_data(data_version, fondos, vigencias, departamentos, entidades, texto)
+    return df.groupby("nombrefondo", observed=True, sort=False).agg(
+        registros=("presupuestosgrinversion", "size"),
+        presupuesto=("presupuestosgrinversion", "sum"),
+        aprobado=("recursosaprobadosasignadosspgr", "sum"),
+        pendiente=("SALDO_PENDIENTE", "sum"),
+    )
+
+
+@st.cache_resource
+def _read_municipios():
+    """Read municipality coordinates from divipola.csv, indexed by DANE code
+    (`COD_MPIO_CLEAN`, sorted) so map joins reuse the index.
+
+    The parsed frame is persisted as Parquet so cold starts skip the CSV
+    parse; the Parquet copy is rebuilt whenever the CSV is newer. Raises on
+    failure, so a failed read is not cached.
+    """
+    parquet_fresh = (
+        os.path.exists(MUNICIPIOS_PARQUET_PATH)
+        and os.path.getmtime(MUNICIPIOS_PARQUET_PATH)
+        >= os.path.getmtime(MUNICIPIOS_CSV_PATH)
+    )
+    if parquet_fresh:
+        try:
+            # A cache written with another layout is ignored and rebuilt
+            cached = pd.read_parquet(MUNICIPIOS_PARQUET_PATH, columns=MUNICIPIOS_COLUMNS)
+            if cached.index.name == "COD_MPIO_CLEAN":
+                return cached
+        except Exception:
+            pass
+
+    # Only the join/position columns are parsed (the WKT "Geo Municipio"
+    # text is skipped); "5,001"-style codes parse straight to integers.
+    municipios_df = pd.read_csv(
+        MUNICIPIOS_CSV_PATH,
+        usecols=["COD_MPIO", "NOM_MPIO", "NOM_DPTO", "LATITUD", "LONGITUD"],
+        thousands=",",
+        dtype={"COD_MPIO": "int32", "LATITUD": "float32", "LONGITUD": "float32"},
+        encoding="utf-8-sig",
+        index_col="COD_MPIO",
+    ).rename_axis("COD_MPIO_CLEAN").sort_index()[MUNICIPIOS_COLUMNS]
+    try:
+        municipios_df.to_parquet(MUNICIPIOS_PARQUET_PATH)
+    except Exception:
+        pass  # read-only checkout: the CSV path keeps working
+    return municipios_df
 
 
-@st.cache_data
 def load_municipios_geo():
-    """Load municipality coordinates from divipola.csv."""
+    """Load municipality coordinates, or an empty frame if unavailable.
+
+    Cached as a shared resource: callers must treat the frame as read-only.
+    """
     try:
-        municipios_df = pd.read_csv("divipola.csv")
-        municipios_df["COD_MPIO_CLEAN"] = (
-            municipios_df["COD_MPIO"].astype(str).str.replace(",", "").astype(int)
-        )
-        return municipios_df
+        return _read_municipios()
     except Exception as e:
         st.warning(f"No se pudo cargar el archivo de municipios: {e}")
         return pd.DataFrame()
 
 
-@st.cache_data
-def load_colombia_geojson():
-    """Load Colombia department boundaries GeoJSON (local first, then remote fallback)."""
+def _drop_repeated_vertices(ring):
+    """Drop consecutive duplicate positions left by rounding; a ring that
+    would fall below four positions is kept as it was."""
+    out = ring[:1]
+    for point in ring[1:]:
+        if point != out[-1]:
+            out.append(point)
+    return out if len(out) >= 4 else ring
+
+
+def _parse_geojson(payload):
+    """Parse GeoJSON bytes with coordinates rounded to GEOJSON_COORD_DECIMALS
+    and repeated vertices dropped, so less geometry is sent to the browser."""
+    geojson = json.loads(
+        payload, parse_float=lambda s: round(float(s), GEOJSON_COORD_DECIMALS)
+    )
+    for feature in geojson.get("features", []):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "Polygon":
+            geometry["coordinates"] = [
+                _drop_repeated_vertices(ring) for ring in geometry["coordinates"]
+            ]
+        elif geometry.get("type") == "MultiPolygon":
+            geometry["coordinates"] = [
+                [_drop_repeated_vertices(ring) for ring in polygon]
+                for polygon in geometry["coordinates"]
+            ]
+    return _add_dept_keys(geojson)
+
+
+def _add_dept_keys(geojson):
+    """Store each feature's normalized department name (upper, stripped, no
+    accents) as a `dept_key` property, so renders match it against
+    `dept_normalized` without re-normalizing the names every time."""
+    for feature in geojson.get("features", []):
+        props = feature.setdefault("properties", {})
+        props["dept_key"] = strip_accents(str(props.get("NOMBRE_DPT", "")).upper().strip())
+    return geojson
+
+
+@st.cache_resource
+def _fetch_colombia_geojson():
+    """Read the department GeoJSON (local first, then remote fallback).
+
+    Raises on failure, so a failed fetch is not cached and the next call
+    retries; only a successfully parsed dict is kept.
+    """
     # Try local file first
     if os.path.exists(GEOJSON_LOCAL_PATH):
         try:
-            with open(GEOJSON_LOCAL_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(GEOJSON_LOCAL_PATH, "rb") as f:
+                return _parse_geojson(f.read())
         except Exception:
             pass
 
-    # Fallback to remote URL
+    # Fallback to remote URL; the payload is written back to the local path so
+    # the next cold start skips the download.
+    response = requests.get(GEOJSON_URL, timeout=15)
+    response.raise_for_status()
+    geojson = _parse_geojson(response.content)
+    try:
+        os.makedirs(os.path.dirname(GEOJSON_LOCAL_PATH), exist_ok=True)
+        with open(GEOJSON_LOCAL_PATH, "wb") as f:
+            f.write(response.content)
+    except Exception:
+        pass  # read-only checkout: keep fetching remotely
+    return geojson
+
+
+def load_colombia_geojson():
+    """Load Colombia department boundaries GeoJSON, or None if unavailable.
+
+    Cached as a shared resource: callers must treat the dict as read-only.
+    """
     try:
-        response = requests.get(GEOJSON_URL, timeout=15)
-        if response.status_code == 200:
-            return response.json()
+        return _fetch_colombia_geojson()
     except Exception as e:
         st.warning(f"Error al cargar GeoJSON: {e}")
-    return None
+        return None
 
 
+@st.cache_data(ttl=CACHE_TTL, max_entries=32)
 def prepare_map_data(df_filtrado, municipios_df):
     """Prepare municipality-level data for the scatter map.
 
     Returns (map_data, unmatched_df) — unmatched_df lists entities whose DANE code
-    did not match any row in divipola.csv.
+    did not match any row in divipola.csv. Cached on the frames' content, so
+    tab switches and unrelated widget changes skip the aggregate/join/tooltip pass.
     """
     empty_unmatched = pd.DataFrame(
         columns=["codigodaneentidad", "nombreentidad", "nombredepartamento"]
@@ -144,48 +470,36 @@ def prepare_map_data(df_filtrado, municipios_df):
         group_cols = ["codigodaneentidad", "nombreentidad", "nombredepartamento"]
         df_agrupado = aggregate_sgr_data(df_filtrado, group_cols)
 
-        map_data = pd.merge(
-            df_agrupado,
-            municipios_df[["COD_MPIO_CLEAN", "NOM_MPIO", "NOM_DPTO", "LATITUD", "LONGITUD"]],
-            left_on="codigodaneentidad",
-            right_on="COD_MPIO_CLEAN",
-            how="inner",
-        )
+        # Key join against the cached DANE-code index: only the aggregated
+        # side is hashed, and the unmatched check reuses the same index.
+        map_data = df_agrupado.join(
+            municipios_df[MUNICIPIOS_COLUMNS], on="codigodaneentidad", how="inner",
+        ).reset_index(drop=True)
 
-        matched_codes = set(map_data["codigodaneentidad"].unique())
         unmatched_df = df_agrupado[
-            ~df_agrupado["codigodaneentidad"].isin(matched_codes)
+            ~df_agrupado["codigodaneentidad"].isin(municipios_df.index)
         ][group_cols].copy()
 
         if len(map_data) > 0:
             intensity = normalize_color_intensity(map_data["presupuestosgrinversion"])
-            # Blue ramp: light #E8EEF4 (232,238,244) -> dark #083358 (8,51,88)
-            t = intensity / 255.0
-            map_data["color_r"] = (232 + (8 - 232) * t).astype(int)
-            map_data["color_g"] = (238 + (51 - 238) * t).astype(int)
-            map_data["color_b"] = (244 + (88 - 244) * t).astype(int)
-            map_data["color_a"] = 220
-
-            def _build_tooltip(row):
-                presupuesto = row["presupuestosgrinversion"]
-                aprobado = row["recursosaprobadosasignadosspgr"]
-                saldo = row["SALDO_PENDIENTE"]
-                ejecucion = (aprobado / presupuesto * 100) if presupuesto > 0 else 0
-                proyectos = (
-                    int(row["numeroproyectosaprobados"])
-                    if pd.notna(row["numeroproyectosaprobados"]) else 0
-                )
-                return (
-                    f"{row['NOM_MPIO']}\n"
-                    f"{row['NOM_DPTO']}\n"
-                    f"Presupuesto: ${presupuesto:,.0f}\n"
-                    f"Aprobado: ${aprobado:,.0f} ({ejecucion:.1f}%)\n"
-                    f"Saldo pendiente: ${saldo:,.0f}\n"
-                    f"Fondo: {row['nombrefondo']}\n"
-                    f"Proyectos: {proyectos}"
-                )
-
-            map_data["tooltip"] = map_data.apply(_build_tooltip, axis=1)
+            map_data["color"] = blue_ramp_rgba(intensity, alpha=220).tolist()
+
+            # Tooltips are built column-wise: one string concat per field
+            # instead of a Python call per municipality.
+            presupuesto = map_data["presupuestosgrinversion"]
+            aprobado = map_data["recursosaprobadosasignadosspgr"]
+            ejecucion = (aprobado / presupuesto * 100).where(presupuesto > 0, 0)
+            map_data["tooltip"] = (
+                map_data["NOM_MPIO"].astype(str) + "\n"
+                + map_data["NOM_DPTO"].astype(str)
+                + "\nPresupuesto: " + presupuesto.map("${:,.0f}".format)
+                + "\nAprobado: " + aprobado.map("${:,.0f}".format)
+                + " (" + ejecucion.map("{:.1f}%)".format)
+                + "\nSaldo pendiente: "
+                + map_data["SALDO_PENDIENTE"].map("${:,.0f}".format)
+                + "\nFondo: " + map_data["nombrefondo"].astype(str)
+                + "\nProyectos: " + map_data["numeroproyectosaprobados"].astype(str)
+            )
 
         return map_data, unmatched_df
 
@@ -194,19 +508,17 @@ def prepare_map_data(df_filtrado, municipios_df):
         return pd.DataFrame(), empty_unmatched
 
 
+@st.cache_data(ttl=CACHE_TTL, max_entries=32)
 def prepare_choropleth_data(df_filtrado):
-    """Prepare department-level aggregated data for choropleth map."""
+    """Prepare department-level aggregated data for choropleth map (cached)."""
     try:
         dept_data = aggregate_sgr_data(df_filtrado, ["nombredepartamento"])
 
-        dept_data["dept_normalized"] = dept_data["nombredepartamento"].str.upper().str.strip()
-
-        for old_name, new_name in DEPT_NAME_MAPPING.items():
-            dept_data.loc[
-                dept_data["dept_normalized"] == old_name, "dept_normalized"
-            ] = new_name
-
-        dept_data["dept_normalized"] = dept_data["dept_normalized"].map(strip_accents)
+        # One hash lookup for the GeoJSON name aliases, then accent stripping
+        names = dept_data["nombredepartamento"].astype(str).str.upper().str.strip()
+        dept_data["dept_normalized"] = (
+            names.map(DEPT_NAME_MAPPING).fillna(names).map(strip_accents)
+        )
 
         return dept_data
 
@@ -219,29 +531,20 @@ def prepare_choropleth_data(df_filtrado):
 def load_proyectos():
     """Fetch DNP-ProyectosSGR (mzgh-shtp) from Socrata with pagination + retry.
 
-    Returns (DataFrame, rows_fetched). Numeric columns are coerced.
+    Returns (DataFrame, rows_fetched, loaded_at); loaded_at keys
+    `filter_proyectos` the same way load_data's keys `filter_data`. Numeric
+    columns are coerced.
     """
     for attempt in range(1, API_MAX_RETRIES + 1):
         try:
-            client = Socrata(SOCRATA_DOMAIN, None)
-            all_results = []
-            offset = 0
-            while True:
-                batch = client.get(
-                    DATASET_ID_PROYECTOS, limit=API_ROW_LIMIT, offset=offset,
-                )
-                if not batch:
-                    break
-                all_results.extend(batch)
-                if len(batch) < API_ROW_LIMIT:
-                    break
-                offset += API_ROW_LIMIT
-
-            df = pd.DataFrame.from_records(all_results)
+            client = _socrata_client()
+            all_results = _fetch_all_rows(client, DATASET_ID_PROYECTOS)
+
+            df = _records_frame(all_results)
             rows_fetched = len(df)
 
             if df.empty:
-                return df, 0
+                return df, 0, time.time()
 
             numeric_cols = ["valortotal", "ejecucionfisica", "ejecucionfinanciera"]
             for col in numeric_cols:
@@ -252,11 +555,40 @@ def load_proyectos():
                 if col in df.columns:
                     df[col] = df[col].astype(str).str.strip()
 
-            return df, rows_fetched
+            return df, rows_fetched, time.time()
 
         except Exception as e:
             if attempt < API_MAX_RETRIES:
                 time.sleep(API_RETRY_BACKOFF * attempt)
             else:
                 st.error(f"Error al cargar proyectos tras {API_MAX_RETRIES} intentos: {e}")
-                return pd.DataFrame(), 0
+                return pd.DataFrame(), 0, time.time()
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=32)
+def filter_proyectos(data_version, departamentos=(), sectores=(), estados=()):
+    """Apply the sidebar department filter and the tab's sector/estado filters
+    to the proyectos frame.
+
+    Same pattern as `filter_data`: keyed on load_proyectos' loaded_at and the
+    filter tuples, one combined mask, one indexing pass.
+    """
+    df, _, _ = load_proyectos()
+    if df.empty:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    if departamentos and "departamento" in df.columns:
+        deptos_norm = {d.upper().strip() for d in departamentos}
+        mask &= df["departamento"].str.upper().isin(deptos_norm).to_numpy()
+    if sectores:
+        mask &= df["sector"].isin(sectores).to_numpy()
+    if estados:
+        mask &= df["estado"].isin(estados).to_numpy()
+    return df[mask]
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=8, show_spinner=False)
+def export_excel(df):
+    """Excel bytes for a download button, cached on the frame's content so
+    clicking the same selection again reuses the file instead of rebuilding it."""
+    return convert_df_to_excel(df)
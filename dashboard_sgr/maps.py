@@ -2,19 +2,36 @@ import pandas as pd
 import pydeck as pdk
 import streamlit as st
 
-from dashboard_sgr.config import MAP_CENTER_LAT, MAP_CENTER_LON, DEFAULT_ZOOM, MAP_STYLE
+from dashboard_sgr.config import (
+    DEFAULT_ZOOM,
+    MAP_CENTER_LAT,
+    MAP_CENTER_LON,
+    MAP_HEATMAP_MIN_POINTS,
+    MAP_STYLE,
+)
 from dashboard_sgr.data import prepare_choropleth_data
-from dashboard_sgr.utils import normalize_color_intensity, strip_accents
+from dashboard_sgr.utils import blue_ramp_rgba, normalize_color_intensity
 
 
-# Professional blue gradient: light -> dark navy. Input: intensity 0-255.
-def _blue_ramp(intensity):
-    # Light #E8EEF4 (232,238,244) -> Dark #083358 (8,51,88)
-    t = intensity / 255.0
-    r = int(232 + (8 - 232) * t)
-    g = int(238 + (51 - 238) * t)
-    b = int(244 + (88 - 244) * t)
-    return [r, g, b, 210]
+def _annotate_geojson(geojson_data, lookup):
+    """Copy `geojson_data` with per-department fill_color/tooltip properties.
+
+    Features are matched on the `dept_key` computed once at load time. Each
+    keeps only the two properties the layer reads, so the source attributes
+    (DPTO, AREA, ...) are not serialized to the browser. Geometries stay
+    shared with the cached (read-only) GeoJSON.
+    """
+    features = []
+    for feature in geojson_data["features"]:
+        props = lookup.get(feature["properties"].get("dept_key"))
+        if props is None:
+            raw_name = feature["properties"].get("NOMBRE_DPT", "").upper().strip()
+            props = {
+                "fill_color": [203, 213, 225, 140],
+                "tooltip": f"{raw_name}\nSin datos disponibles",
+            }
+        features.append({**feature, "properties": props})
+    return {"type": geojson_data.get("type", "FeatureCollection"), "features": features}
 
 
 def create_choropleth_map(df_filtrado, geojson_data):
@@ -28,43 +45,20 @@ def create_choropleth_map(df_filtrado, geojson_data):
             return None
 
         intensity = normalize_color_intensity(dept_data["presupuestosgrinversion"])
-        dept_data["color_intensity"] = intensity
-
-        color_dict = {}
-        tooltip_dict = {}
-
-        for _, row in dept_data.iterrows():
-            dept_name = row["dept_normalized"]
-            i = row["color_intensity"]
-            color_dict[dept_name] = _blue_ramp(i)
-
-            proyectos = int(row["numeroproyectosaprobados"]) if pd.notna(row["numeroproyectosaprobados"]) else 0
-            tooltip_dict[dept_name] = (
-                f"DEPARTAMENTO: {row['nombredepartamento']}\n"
-                f"Presupuesto: ${row['presupuestosgrinversion']:,.0f}\n"
-                f"Fondos: {row['nombrefondo']}\n"
-                f"Proyectos: {proyectos:,}\n"
-                f"Recursos Aprobados: ${row['recursosaprobadosasignadosspgr']:,.0f}"
-            )
-
-        geojson_render = {
-            "type": geojson_data.get("type", "FeatureCollection"),
-            "features": [],
+        colors = blue_ramp_rgba(intensity, alpha=210).tolist()
+        tooltips = (
+            "DEPARTAMENTO: " + dept_data["nombredepartamento"].astype(str)
+            + "\nPresupuesto: " + dept_data["presupuestosgrinversion"].map("${:,.0f}".format)
+            + "\nFondos: " + dept_data["nombrefondo"].astype(str)
+            + "\nProyectos: " + dept_data["numeroproyectosaprobados"].map("{:,}".format)
+            + "\nRecursos Aprobados: "
+            + dept_data["recursosaprobadosasignadosspgr"].map("${:,.0f}".format)
+        )
+        lookup = {
+            dept: {"fill_color": color, "tooltip": tooltip}
+            for dept, color, tooltip in zip(dept_data["dept_normalized"], colors, tooltips)
         }
-        for feature in geojson_data["features"]:
-            raw_name = feature["properties"].get("NOMBRE_DPT", "").upper().strip()
-            dept_key = strip_accents(raw_name)
-            new_props = dict(feature["properties"])
-            if dept_key in color_dict:
-                new_props["fill_color"] = color_dict[dept_key]
-                new_props["tooltip"] = tooltip_dict[dept_key]
-            else:
-                new_props["fill_color"] = [203, 213, 225, 140]
-                new_props["tooltip"] = f"{raw_name}\nSin datos disponibles"
-            geojson_render["features"].append({
-                **feature,
-                "properties": new_props,
-            })
+        geojson_render = _annotate_geojson(geojson_data, lookup)
 
         choropleth_layer = pdk.Layer(
             "GeoJsonLayer",
@@ -113,18 +107,46 @@ def create_choropleth_map(df_filtrado, geojson_data):
 
 
 def create_pydeck_map(map_data):
-    """Create a scatter plot map at the municipality level."""
+    """Create a scatter plot map at the municipality level.
+
+    Wide selections (MAP_HEATMAP_MIN_POINTS or more municipalities) render as
+    a budget-weighted HeatmapLayer: one GPU aggregation pass instead of
+    hundreds of hit-tested circles. Tooltips are only available on the
+    scatter view.
+    """
     if map_data.empty:
         return None
 
     center_lat = map_data["LATITUD"].mean()
     center_lon = map_data["LONGITUD"].mean()
 
+    view_state = pdk.ViewState(
+        latitude=center_lat, longitude=center_lon,
+        zoom=5.5, pitch=0, bearing=0,
+    )
+
+    if len(map_data) >= MAP_HEATMAP_MIN_POINTS:
+        heatmap_layer = pdk.Layer(
+            "HeatmapLayer",
+            data=map_data[["LONGITUD", "LATITUD", "presupuestosgrinversion"]],
+            get_position=["LONGITUD", "LATITUD"],
+            get_weight="presupuestosgrinversion",
+            aggregation="SUM",
+            radius_pixels=40,
+        )
+        return pdk.Deck(
+            layers=[heatmap_layer],
+            initial_view_state=view_state,
+            map_style=MAP_STYLE,
+        )
+
+    # Only the columns the layer and tooltip read are serialized to the
+    # browser; the aggregated sums and fund-name lists stay server-side.
     circle_layer = pdk.Layer(
         "ScatterplotLayer",
-        data=map_data,
+        data=map_data[["LONGITUD", "LATITUD", "color", "tooltip"]],
         get_position=["LONGITUD", "LATITUD"],
-        get_color=["color_r", "color_g", "color_b", "color_a"],
+        get_color="color",
         get_radius=8000,
         radius_scale=1,
         radius_min_pixels=8,
@@ -133,11 +155,6 @@ def create_pydeck_map(map_data):
         auto_highlight=True,
     )
 
-    view_state = pdk.ViewState(
-        latitude=center_lat, longitude=center_lon,
-        zoom=5.5, pitch=0, bearing=0,
-    )
-
     tooltip = {
         "html": "<b>{tooltip}</b>",
         "style": {
@@ -1,7 +1,11 @@
 import io
 import unicodedata
+from bisect import bisect_right
+from functools import lru_cache
 
+import numpy as np
 import pandas as pd
+import xlsxwriter
 
 
 def strip_accents(text):
@@ -13,22 +17,29 @@ def strip_accents(text):
     )
 
 
+# Known abbreviations for fund names, applied in order
+_FONDO_ABBREVIATIONS = (
+    ("ASIGNACION PARA LA INVERSION LOCAL", "INVERSION LOCAL"),
+    ("ASIGNACIONES DIRECTAS", "ASIG. DIRECTAS"),
+    ("CIENCIA, TECNOLOGIA E INNOVACION", "CTeI"),
+    ("AMBIENTE Y DESARROLLO SOSTENIBLE", "AMBIENTE"),
+    ("PAZ Y POSCONFLICTO", "PAZ"),
+    ("AHORRO Y ESTABILIZACION", "AHORRO"),
+    ("REGIONAL", "REG."),
+)
+
+
+@lru_cache(maxsize=256)
 def short_fondo_name(name, max_len=40):
-    """Shorten verbose SGR fund names for chart labels."""
+    """Shorten verbose SGR fund names for chart labels.
+
+    Memoized: there are only a few dozen distinct fund names, so the
+    replacement chain runs once per name per process.
+    """
     if not isinstance(name, str):
         return name
-    # Known abbreviations
-    replacements = [
-        ("ASIGNACION PARA LA INVERSION LOCAL", "INVERSION LOCAL"),
-        ("ASIGNACIONES DIRECTAS", "ASIG. DIRECTAS"),
-        ("CIENCIA, TECNOLOGIA E INNOVACION", "CTeI"),
-        ("AMBIENTE Y DESARROLLO SOSTENIBLE", "AMBIENTE"),
-        ("PAZ Y POSCONFLICTO", "PAZ"),
-        ("AHORRO Y ESTABILIZACION", "AHORRO"),
-        ("REGIONAL", "REG."),
-    ]
     result = name
-    for long, short in replacements:
+    for long, short in _FONDO_ABBREVIATIONS:
         result = result.replace(long, short)
     result = " ".join(result.split())  # collapse whitespace
     if len(result) > max_len:
@@ -36,13 +47,36 @@ def short_fondo_name(name, max_len=40):
     return result
 
 
-def normalize_color_intensity(series):
-    """Normalize a numeric series to 0-255 range for color mapping."""
-    min_val = series.min()
-    max_val = series.max()
+def normalize_color_intensity(values):
+    """Normalize numeric values to a 0-255 uint8 array for color mapping."""
+    x = np.asarray(values, dtype=float)
+    if len(x) == 0:
+        return np.empty(0, dtype=np.uint8)
+    min_val = x.min()
+    max_val = x.max()
     if max_val > min_val:
-        return ((series - min_val) / (max_val - min_val) * 255).astype(int)
-    return pd.Series(128, index=series.index)
+        return ((x - min_val) / (max_val - min_val) * 255).astype(np.uint8)
+    return np.full(len(x), 128, dtype=np.uint8)
+
+
+def blue_ramp_rgba(intensity, alpha):
+    """Map 0-255 intensities to uint8 RGBA rows on the light -> navy ramp."""
+    # Light #E8EEF4 (232,238,244) -> Dark #083358 (8,51,88)
+    light = np.array([232, 238, 244])
+    dark = np.array([8, 51, 88])
+    t = np.asarray(intensity, dtype=float)[:, None] / 255.0
+    rgba = np.empty((len(t), 4), dtype=np.uint8)
+    rgba[:, :3] = light + (dark - light) * t
+    rgba[:, 3] = alpha
+    return rgba
+
+
+# Magnitude tiers shared by format_currency and format_currency_series:
+# values below _CURRENCY_THRESHOLDS[0] print in full, tier i divides by
+# _CURRENCY_DIVISORS[i] and appends _CURRENCY_SUFFIXES[i].
+_CURRENCY_THRESHOLDS = (1e3, 1e6, 1e9, 1e12)
+_CURRENCY_DIVISORS = (1.0, 1e3, 1e6, 1e9, 1e12)
+_CURRENCY_SUFFIXES = ("", "K", "M", "B", "T")
 
 
 def format_currency(value):
@@ -51,31 +85,98 @@ def format_currency(value):
         return "$0"
     abs_val = abs(value)
     sign = "" if value >= 0 else "-"
-    if abs_val >= 1_000_000_000_000:
-        return f"{sign}${abs_val / 1_000_000_000_000:.1f}T"
-    if abs_val >= 1_000_000_000:
-        return f"{sign}${abs_val / 1_000_000_000:.1f}B"
-    if abs_val >= 1_000_000:
-        return f"{sign}${abs_val / 1_000_000:.1f}M"
-    if abs_val >= 1_000:
-        return f"{sign}${abs_val / 1_000:.1f}K"
+    tier = bisect_right(_CURRENCY_THRESHOLDS, abs_val)
+    if tier:
+        return f"{sign}${abs_val / _CURRENCY_DIVISORS[tier]:.1f}{_CURRENCY_SUFFIXES[tier]}"
     return f"{sign}${abs_val:,.0f}"
 
 
+def format_currency_series(values):
+    """Vectorized `format_currency` for a Series or array; returns a list.
+
+    Sign, magnitude bucket and scaled value are computed with NumPy; only the
+    final string format runs per element.
+    """
+    arr = np.asarray(values, dtype=float)
+    abs_vals = np.abs(arr)
+    bucket = np.searchsorted(_CURRENCY_THRESHOLDS, abs_vals, side="right")
+    scaled = abs_vals / np.asarray(_CURRENCY_DIVISORS)[bucket]
+    is_zero = np.isnan(arr) | (arr == 0)
+    negative = arr < 0
+    return [
+        "$0" if zero
+        else f"{'-' if neg else ''}${val:.1f}{_CURRENCY_SUFFIXES[b]}" if b
+        else f"{'-' if neg else ''}${val:,.0f}"
+        for zero, neg, val, b in zip(is_zero.tolist(), negative.tolist(),
+                                     scaled.tolist(), bucket.tolist())
+    ]
+
+
 def aggregate_sgr_data(df, group_cols):
     """Aggregate SGR data by given columns with standard monetary sums."""
-    return df.groupby(group_cols).agg({
-        "presupuestosgrinversion": "sum",
-        "recursosaprobadosasignadosspgr": "sum",
-        "SALDO_PENDIENTE": "sum",
-        "numeroproyectosaprobados": lambda x: pd.to_numeric(x, errors="coerce").fillna(0).sum(),
-        "nombrefondo": lambda x: ", ".join(x.unique()),
-    }).reset_index()
+    sum_cols = [
+        "presupuestosgrinversion",
+        "recursosaprobadosasignadosspgr",
+        "SALDO_PENDIENTE",
+        "numeroproyectosaprobados",
+    ]
+    # Project to the columns the aggregation reads, so codes, entity names
+    # and vigencia are not carried through the groupby. load_data already
+    # stores numeroproyectosaprobados as nullable Int32; missing counts are
+    # skipped by the sum.
+    df = df[list(dict.fromkeys(group_cols + sum_cols + ["nombrefondo"]))]
+    sums = df.groupby(group_cols, observed=True)[sum_cols].sum()
+    # Fund names are joined on the de-duplicated (group, fondo) pairs only, so
+    # the Python join sees a few rows per group and the sums stay vectorized.
+    fondos = (
+        df.drop_duplicates(group_cols + ["nombrefondo"])
+        .groupby(group_cols, observed=True)["nombrefondo"]
+        .agg(", ".join)
+    )
+    return pd.concat([sums, fondos], axis=1).reset_index()
 
 
 def convert_df_to_excel(df):
-    """Convert a DataFrame to Excel bytes for download."""
+    """Convert a DataFrame to Excel bytes for download.
+
+    Rows are streamed to xlsxwriter with `write_row` instead of going through
+    `DataFrame.to_excel`, which builds a styled cell object per value. The
+    header keeps to_excel's bold, bordered, centered style, datetimes get its
+    default date format, and float columns a two-decimal number format at
+    column level; missing values are left blank. Infinite values are written
+    as Excel error cells instead of raising, and text is never turned into
+    hyperlinks.
+    """
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Datos_SGR", float_format="%.2f")
+    workbook = xlsxwriter.Workbook(output, {
+        "nan_inf_to_errors": True,
+        "strings_to_urls": False,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    })
+    worksheet = workbook.add_worksheet("Datos_SGR")
+    header_fmt = workbook.add_format(
+        {"bold": True, "border": 1, "align": "center", "valign": "top"}
+    )
+    money_fmt = workbook.add_format({"num_format": "#,##0.00"})
+    for idx, col in enumerate(df.columns):
+        if pd.api.types.is_float_dtype(df[col]):
+            worksheet.set_column(idx, idx, None, money_fmt)
+    worksheet.write_row(0, 0, [str(col) for col in df.columns], header_fmt)
+    # Python scalars, with None for NaN/NA so the cell stays empty.
+    columns = [
+        df[col].astype(object).where(df[col].notna(), None).tolist()
+        for col in df.columns
+    ]
+    for row_idx, row in enumerate(zip(*columns), start=1):
+        worksheet.write_row(row_idx, 0, row)
+    workbook.close()
     return output.getvalue()
+
+
+def convert_df_to_csv(df):
+    """Convert a DataFrame to UTF-8 CSV bytes for download.
+
+    Written by pandas' C writer, so it is much faster than the Excel export on
+    large selections. The BOM lets Excel open accented names correctly.
+    """
+    return df.to_csv(index=False).encode("utf-8-sig")
@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from dashboard_sgr.charts import _drop_catchall
+
+
+class DropCatchallTest(unittest.TestCase):
+    def test_nan_codes_are_kept(self):
+        df = pd.DataFrame({
+            "nombredepartamento": pd.Categorical(
+                ["ANTIOQUIA", None, "OTROS", "sin ubicación ", np.nan]
+            ),
+            "valor": range(5),
+        })
+        self.assertEqual(df["nombredepartamento"].cat.codes.tolist().count(-1), 2)
+        result = _drop_catchall(df, ["nombredepartamento"])
+        # NaN rows (code -1) survive, as with the string comparison
+        self.assertEqual(result["valor"].tolist(), [0, 1, 4])
+
+    def test_catchall_names_missing_from_categories(self):
+        df = pd.DataFrame({
+            "nombredepartamento": pd.Categorical(
+                ["ANTIOQUIA", "BOYACA", None], categories=["ANTIOQUIA", "BOYACA", "CESAR"]
+            ),
+            "nombreentidad": pd.Categorical(["MEDELLIN", "TUNJA", "VALLEDUPAR"]),
+        })
+        result = _drop_catchall(df, ["nombredepartamento", "nombreentidad"])
+        self.assertIs(type(result), pd.DataFrame)
+        self.assertEqual(len(result), 3)
+
+    def test_matches_string_comparison(self):
+        values = ["ANTIOQUIA", "OTROS", None, "SIN UBICACION", "CESAR", "Otros "]
+        cat_df = pd.DataFrame({"nombreentidad": pd.Categorical(values)})
+        str_df = pd.DataFrame({"nombreentidad": pd.Series(values, dtype=object)})
+        self.assertEqual(
+            _drop_catchall(cat_df, ["nombreentidad"]).index.tolist(),
+            _drop_catchall(str_df, ["nombreentidad"]).index.tolist(),
+        )
+
+    def test_missing_column_is_ignored(self):
+        df = pd.DataFrame({"nombredepartamento": pd.Categorical(["OTROS", "CESAR"])})
+        result = _drop_catchall(df, ["nombreentidad", "nombredepartamento"])
+        self.assertEqual(result["nombredepartamento"].tolist(), ["CESAR"])
+
+
+if __name__ == "__main__":
+    unittest.main()
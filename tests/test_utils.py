@@ -0,0 +1,197 @@
+import io
+import math
+import re
+import unittest
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from dashboard_sgr.utils import (
+    aggregate_sgr_data,
+    convert_df_to_excel,
+    format_currency,
+    format_currency_series,
+)
+
+
+def _sheet_xml(xlsx_bytes):
+    with zipfile.ZipFile(io.BytesIO(xlsx_bytes)) as archive:
+        return archive.read("xl/worksheets/sheet1.xml").decode(), archive.namelist()
+
+
+def _styles_xml(xlsx_bytes):
+    with zipfile.ZipFile(io.BytesIO(xlsx_bytes)) as archive:
+        return archive.read("xl/styles.xml").decode()
+
+
+def _cell_xf(styles, sheet, ref):
+    """The <xf> element applied to cell `ref`."""
+    style_id = int(re.search(rf'<c r="{ref}" s="(\d+)"', sheet).group(1))
+    cell_xfs = re.search(r"<cellXfs[^>]*>(.*?)</cellXfs>", styles, re.S).group(1)
+    return re.findall(r"<xf [^>]*?(?:/>|>.*?</xf>)", cell_xfs, re.S)[style_id]
+
+
+class ConvertDfToExcelTest(unittest.TestCase):
+    def test_exports_nan_and_inf(self):
+        df = pd.DataFrame({
+            "presupuestosgrinversion": [1.5, np.nan, np.inf, -np.inf],
+            "nombreentidad": ["A", None, "https://www.datos.gov.co", "B"],
+            "numeroproyectosaprobados": pd.array([3, pd.NA, 0, 1], dtype="Int32"),
+        })
+        sheet, names = _sheet_xml(convert_df_to_excel(df))
+
+        # NaN / None / <NA> leave the cell empty; a real 0 is still written
+        self.assertNotIn('r="A3"', sheet)
+        self.assertNotIn('r="B3"', sheet)
+        self.assertNotIn('r="C3"', sheet)
+        self.assertRegex(sheet, r'<c r="C4"[^>]*><v>0</v>')
+        # +/-inf become error cells instead of raising
+        self.assertEqual(len(re.findall(r'<c r="A[45]"[^>]*t="e"', sheet)), 2)
+        # URL-like text stays a plain string
+        self.assertNotIn("<hyperlinks>", sheet)
+        self.assertNotIn("xl/worksheets/_rels/sheet1.xml.rels", names)
+
+    def test_header_is_bold_bordered_and_centered(self):
+        xlsx = convert_df_to_excel(pd.DataFrame({"vigencia": ["2023 - 2024"], "valor": [1.0]}))
+        sheet, styles = _sheet_xml(xlsx)[0], _styles_xml(xlsx)
+        for ref in ("A1", "B1"):
+            xf = _cell_xf(styles, sheet, ref)
+            font_id = int(re.search(r'fontId="(\d+)"', xf).group(1))
+            fonts = re.findall(r"<font>.*?</font>", styles, re.S)
+            self.assertIn("<b/>", fonts[font_id])
+            self.assertNotIn('borderId="0"', xf)
+            self.assertIn('horizontal="center"', xf)
+        # Data cells do not inherit the header style
+        self.assertNotIn('r="A2" s=', sheet)
+
+    def test_datetimes_get_a_date_format(self):
+        df = pd.DataFrame({"fecha": pd.to_datetime(["2024-01-31 08:30", None])})
+        xlsx = convert_df_to_excel(df)
+        sheet, styles = _sheet_xml(xlsx)[0], _styles_xml(xlsx)
+        xf = _cell_xf(styles, sheet, "A2")
+        fmt_id = re.search(r'numFmtId="(\d+)"', xf).group(1)
+        self.assertIn(f'numFmtId="{fmt_id}" formatCode="yyyy-mm-dd hh:mm:ss"', styles)
+        # NaT stays empty
+        self.assertNotIn('r="A3"', sheet)
+
+    def test_empty_frame_keeps_header(self):
+        df = pd.DataFrame({"vigencia": pd.Series([], dtype="category")})
+        sheet, _ = _sheet_xml(convert_df_to_excel(df))
+        self.assertIn('r="A1"', sheet)
+        self.assertNotIn('r="A2"', sheet)
+
+
+# 0, NaN, negatives, the exact tier boundaries, values just below each
+# boundary (which round up inside the lower tier) and values above 1e15.
+CURRENCY_EDGE_VALUES = [
+    0, np.nan, -1, -999.5, -1500, -2.5e9, 0.4, 999.4, 999.5, 1234.5,
+    1e3, 1e6, 1e9, 1e12,
+    math.nextafter(1e3, 0), 999_999, math.nextafter(1e6, 0),
+    999_999_999, math.nextafter(1e9, 0), math.nextafter(1e12, 0),
+    1e15, 3.2e16, -7e17,
+]
+
+
+class FormatCurrencyTest(unittest.TestCase):
+    def test_tiers_match_the_original_if_cascade(self):
+        # Expected strings were produced by the if/elif cascade that the
+        # threshold lookup replaced.
+        expected = [
+            "$0", "$0", "-$1", "-$1,000", "-$1.5K", "-$2.5B", "$0", "$999", "$1,000",
+            "$1.2K",
+            "$1.0K", "$1.0M", "$1.0B", "$1.0T",
+            "$1,000", "$1000.0K", "$1000.0K",
+            "$1000.0M", "$1000.0M", "$1000.0B",
+            "$1000.0T", "$32000.0T", "-$700000.0T",
+        ]
+        self.assertEqual([format_currency(v) for v in CURRENCY_EDGE_VALUES], expected)
+
+    def test_accepts_numpy_scalars(self):
+        self.assertEqual(format_currency(np.int64(2500)), "$2.5K")
+        self.assertEqual(format_currency(np.float32(-3e6)), "-$3.0M")
+
+
+class FormatCurrencySeriesTest(unittest.TestCase):
+    def test_matches_scalar_on_edge_values(self):
+        expected = [format_currency(v) for v in CURRENCY_EDGE_VALUES]
+        self.assertEqual(format_currency_series(CURRENCY_EDGE_VALUES), expected)
+        self.assertEqual(format_currency_series(pd.Series(CURRENCY_EDGE_VALUES)), expected)
+
+    def test_matches_scalar_on_random_magnitudes(self):
+        rng = np.random.default_rng(0)
+        values = rng.standard_normal(5000) * 10.0 ** rng.integers(0, 17, 5000)
+        self.assertEqual(
+            format_currency_series(values), [format_currency(v) for v in values]
+        )
+
+    def test_empty_input(self):
+        self.assertEqual(format_currency_series(pd.Series([], dtype=float)), [])
+
+
+def _reference_aggregate(df, group_cols):
+    """The original single-groupby aggregate_sgr_data (lambda reducers)."""
+    return df.groupby(group_cols, observed=True).agg({
+        "presupuestosgrinversion": "sum",
+        "recursosaprobadosasignadosspgr": "sum",
+        "SALDO_PENDIENTE": "sum",
+        "numeroproyectosaprobados": lambda x: pd.to_numeric(x, errors="coerce").fillna(0).sum(),
+        "nombrefondo": lambda x: ", ".join(x.unique()),
+    }).reset_index()
+
+
+class AggregateSgrDataTest(unittest.TestCase):
+    def setUp(self):
+        fondos = ["ASIGNACIONES DIRECTAS", "INVERSION LOCAL", "CTeI", "SIN USO"]
+        deptos = ["ANTIOQUIA", "BOYACA", "CESAR", "SIN REGISTROS"]
+        rng = np.random.default_rng(0)
+        n = 400
+        self.df = pd.DataFrame({
+            "vigencia": pd.Categorical(rng.choice(["2021 - 2022", "2023 - 2024"], n)),
+            # Categories include values with no rows ("SIN USO", "SIN REGISTROS")
+            "nombrefondo": pd.Categorical(rng.choice(fondos[:3], n), categories=fondos),
+            "nombredepartamento": pd.Categorical(rng.choice(deptos[:3], n), categories=deptos),
+            "nombreentidad": pd.Categorical(rng.choice([f"MUNICIPIO {i}" for i in range(12)], n)),
+            "codigodaneentidad": rng.integers(5001, 5013, n).astype("int32"),
+            "presupuestosgrinversion": rng.random(n) * 1e9,
+            "recursosaprobadosasignadosspgr": rng.random(n) * 1e9,
+            "numeroproyectosaprobados": pd.array(rng.integers(0, 9, n), dtype="Int32"),
+        })
+        # load_data keeps missing project counts as <NA>
+        self.df.loc[::7, "numeroproyectosaprobados"] = pd.NA
+        self.df["SALDO_PENDIENTE"] = (
+            self.df["presupuestosgrinversion"] - self.df["recursosaprobadosasignadosspgr"]
+        ).clip(lower=0)
+
+    def assert_matches_reference(self, group_cols):
+        result = aggregate_sgr_data(self.df, group_cols)
+        expected = _reference_aggregate(self.df, group_cols)
+        self.assertEqual(list(result.columns), list(expected.columns))
+        self.assertEqual(len(result), len(expected))
+        for col in group_cols:
+            self.assertEqual(
+                result[col].astype(str).tolist(), expected[col].astype(str).tolist()
+            )
+        for col in ("presupuestosgrinversion", "recursosaprobadosasignadosspgr",
+                    "SALDO_PENDIENTE", "numeroproyectosaprobados"):
+            np.testing.assert_allclose(
+                result[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float)
+            )
+        self.assertEqual(result["nombrefondo"].tolist(), expected["nombrefondo"].tolist())
+
+    def test_single_categorical_key(self):
+        self.assert_matches_reference(["nombredepartamento"])
+        result = aggregate_sgr_data(self.df, ["nombredepartamento"])
+        self.assertNotIn("SIN REGISTROS", result["nombredepartamento"].astype(str).tolist())
+
+    def test_multiple_keys(self):
+        self.assert_matches_reference(["nombreentidad", "nombredepartamento"])
+
+    def test_integer_and_categorical_keys(self):
+        self.assert_matches_reference(
+            ["codigodaneentidad", "nombreentidad", "nombredepartamento"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()